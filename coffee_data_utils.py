@@ -9,6 +9,7 @@ Autor: Elias Basaldua Garcia
 Fecha: Noviembre 2025
 """
 
+import os
 import pandas as pd 
 import numpy as np
 from typing import Dict, List, Tuple, Optional
@@ -73,18 +74,60 @@ CHILDREN_ORDER = {
   'More than 3': 4
 }
 
+# Nombres cortos de las columnas demográficas clave
+COLUMN_RENAMES = {
+  'Submission ID': 'submission_id',
+  'What is your age?': 'age',
+  'How many cups of coffee do you typically drink per day?': 'cups_per_day',
+  'Gender': 'gender',
+  'Education Level': 'education',
+  'Ethnicity/Race': 'ethnicity',
+  'Employment Status': 'employment',
+  'Number of Children': 'children',
+  'Political Affiliation': 'political_affiliation'
+}
+
+# Etiquetas de las variables derivadas (orden de las categorías)
+CONSUMPTION_SEGMENTS = ['Light (<1 cup)', 'Moderate (1-2 cups)', 'Heavy (3+ cups)', 'Unkown']
+
+AGE_GROUPS = [
+  'Gen Z (<25)',
+  'Young Millennials (25-34)',
+  'Older Millennials (35-44)',
+  'Gen X (45-64)',
+  'Boomers+ (65+)',
+  'Unknown'
+]
+
 # -------------------------------------------------------------
 # FUNCIONES DE LIMPIEZA GENERAL
 # -------------------------------------------------------------
 
-def load_and_initial_clean(filepath: str) -> pd.DataFrame:
+def load_and_initial_clean(
+    filepath: str,
+    columns: Optional[List[str]] = None,
+    use_cache: bool = True,
+    max_missing: Optional[float] = None
+) -> pd.DataFrame:
   """
   Carga el dataset y realiza limpieza inicial básica
 
+  Si existe una copia Parquet junto al CSV (mismo nombre, extensión
+  .parquet) y está actualizada, se lee esa copia en lugar de volver a
+  parsear el texto. Si no existe, se crea después de leer el CSV completo
+  (no cuando se piden solo algunas columnas).
+
   Parameters:
   -----------
   filepath : str
-    Ruta al archivo CSV
+    Ruta al archivo CSV o Parquet
+  columns : List[str], optional
+    Columnas a cargar, con nombres ya limpios (default: todas)
+  use_cache : bool
+    Usar/crear la copia Parquet del CSV (default: True)
+  max_missing : float, optional
+    Si se lee desde Parquet, omitir las columnas cuyo porcentaje de missing
+    (según las estadísticas del archivo) supere este umbral, sin leerlas
   
   Returns:
   --------
@@ -92,19 +135,89 @@ def load_and_initial_clean(filepath: str) -> pd.DataFrame:
     Dataset Limpio
   """
 
-  # Cargar datos
-  df = pd.read_csv(filepath)
-
-  # Eliminar BOM si existe
-  df.columns = df.columns.str.replace('\ufeff', '')
-
-  # Renombrar columnas para facilitar manejo
-  df.columns = df.columns.str.strip()
-
+  root, ext = os.path.splitext(filepath)
+  parquet_path = filepath if ext.lower() == '.parquet' else root + '.parquet'
+  cache_is_fresh = (
+    os.path.exists(parquet_path)
+    and (parquet_path == filepath or os.path.getmtime(parquet_path) >= os.path.getmtime(filepath))
+  )
+
+  if cache_is_fresh and (use_cache or parquet_path == filepath):
+    # Parquet ya tiene los nombres limpios y permite leer solo las columnas pedidas
+    if max_missing is not None:
+      dense_cols = _parquet_dense_columns(parquet_path, max_missing)
+      columns = [col for col in (columns or dense_cols) if col in dense_cols]
+    df = pd.read_parquet(parquet_path, engine='pyarrow', columns=columns, dtype_backend='pyarrow')
+  else:
+    # Cargar datos (solo las columnas pedidas, comparando con el nombre limpio).
+    # El motor pyarrow no acepta usecols como función y ya quita el BOM, así que
+    # se traducen los nombres desde la cabecera
+    usecols = None
+    if columns is not None:
+      wanted = set(columns)
+      header = pd.read_csv(filepath, nrows=0).columns.str.replace('\ufeff', '')
+      usecols = [col for col in header if col.strip() in wanted]
+
+    # Motor pyarrow: parseo multihilo y columnas de texto como string[pyarrow]
+    df = pd.read_csv(filepath, usecols=usecols, engine='pyarrow', dtype_backend='pyarrow')
+
+    # Eliminar BOM si existe
+    df.columns = df.columns.str.replace('\ufeff', '')
+
+    # Renombrar columnas para facilitar manejo
+    df.columns = df.columns.str.strip()
+
+    # La copia Parquet tiene que estar completa, así que solo se guarda sin usecols
+    if use_cache and columns is None:
+      try:
+        df.to_parquet(parquet_path, engine='pyarrow', compression='snappy', index=False)
+      except OSError as e:
+        print(f"No se pudo crear la copia Parquet ({e})")
+
+  # read_csv/read_parquet ya guardan cada columna contigua en memoria (los bloques
+  # de pandas son (n_columnas, n_filas) en orden C), así que no hace falta reordenar
   print(f"Dataset cargado: {df.shape[0]} filas | {df.shape[1]} columnas")
 
   return df
 
+def _parquet_dense_columns(path: str, threshold: float) -> List[str]:
+  """
+  Devuelve las columnas de un Parquet con missing <= threshold usando solo
+  los null_count de los metadatos.
+
+  Las columnas de tipo null (vacías) no traen estadísticas y cuentan como
+  100% missing; cualquier otra columna sin estadísticas se conserva. Si el
+  archivo tiene columnas anidadas (struct, list...) las estadísticas son por
+  columna hoja, así que se conservan todas las columnas.
+  """
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+
+  metadata = pq.ParquetFile(path).metadata
+  schema = metadata.schema.to_arrow_schema()
+  if metadata.num_columns != len(schema.names):
+    return list(schema.names)
+
+  null_counts = [0] * len(schema.names)
+  no_stats = set()
+
+  for rg in range(metadata.num_row_groups):
+    row_group = metadata.row_group(rg)
+    for i in range(row_group.num_columns):
+      stats = row_group.column(i).statistics
+      if pa.types.is_null(schema.types[i]):
+        null_counts[i] += row_group.num_rows
+      elif stats is None or not stats.has_null_count:
+        no_stats.add(i)
+      else:
+        null_counts[i] += stats.null_count
+
+  n_rows = max(metadata.num_rows, 1)
+  return [
+    name for i, (name, nulls) in enumerate(zip(schema.names, null_counts))
+    if i in no_stats or nulls / n_rows <= threshold
+  ]
+
 def remove_high_missing_columns(df: pd.DataFrame, threshold: float = 0.95) -> pd.DataFrame:
   """
   Elimina columnas con porcentaje de missing superior al threshold.
@@ -122,14 +235,17 @@ def remove_high_missing_columns(df: pd.DataFrame, threshold: float = 0.95) -> pd
     Dataset sin columnas de alta missing
   """
 
-  missing_pct = df.isnull().sum() / len(df)
+  # df.count() cuenta no-nulos por columna sin materializar un DataFrame booleano
+  missing_pct = (len(df) - df.count()) / len(df)
   cols_to_drop = missing_pct[missing_pct > threshold].index.tolist()
 
   print(f"Eliminando {len(cols_to_drop)} columnas con >{threshold*100}% missing")
   if cols_to_drop:
     print(f"  Columnas eliminadas: {cols_to_drop[:5]}...")
 
-  return df.drop(columns=cols_to_drop)
+  df.drop(columns=cols_to_drop, inplace=True)
+
+  return df
 
 def standardize_column_names(df: pd.DataFrame) -> pd.DataFrame:
   """
@@ -146,20 +262,8 @@ def standardize_column_names(df: pd.DataFrame) -> pd.DataFrame:
     Dataset con nombres de columnas estandarizadas
   """
 
-  # Crear diccionario de mapeo para columnas demográficas clave
-  rename_dict = {
-    'Submission ID': 'submission_id',
-    'What is your age?': 'age',
-    'How many cups of coffee do you typically drink per day?': 'cups_per_day',
-    'Gender': 'gender',
-    'Education Level': 'education',
-    'Ethnicity/Race': 'ethnicity',
-    'Employment Status': 'employment',
-    'Number of Children': 'children',
-    'Political Affiliation': 'political_affiliation'
-  }
-
-  df = df.rename(columns=rename_dict)
+  # Diccionario de mapeo para columnas demográficas clave (COLUMN_RENAMES)
+  df.rename(columns=COLUMN_RENAMES, inplace=True)
   print("Columnas demográficas estandarizadas")
 
   return df
@@ -195,13 +299,18 @@ def encode_ordinal_variable(
   """
 
   new_col = column + new_column_suffix
-  df[new_col] = df[column].map(mapping) # La función .map convierte texto a número usando un diccionario
+
+  # get_indexer busca cada texto en la tabla hash de las claves: devuelve la
+  # posición de su categoría (-1 si es NaN o no está en el diccionario)
+  codes = pd.Index(list(mapping)).get_indexer(df[column])
+  values = np.asarray(list(mapping.values()))
+  df[new_col] = pd.arrays.IntegerArray(values[codes].astype('int8'), mask=codes < 0)
 
   # Reportar valores no mapeados
-  unmapped = df[df[new_col].isna() & df[column].notna()][column].unique()
+  unmapped = df[column][(codes < 0) & df[column].notna().to_numpy()].unique()
   """
-  df[new_col].isna(): 
-  Devuelve True donde la nueva columna (####_encoded) tiene un valor faltante (NaN). 
+  codes < 0: 
+  Devuelve True donde la categoría no se encontró en el diccionario (código -1).
   Es decir, donde el mapeo no encontró correspondencia.
 
   df[column].notna():
@@ -209,11 +318,11 @@ def encode_ordinal_variable(
 
   & (AND lógico):
   Solo queremos las filas donde
-  - La nueva columna es NaN (falló el mapeo),
+  - El código es -1 (falló el mapeo),
   - y la columna original sí tenía algo (no estaba vacía).
   """
   if len(unmapped) > 0:
-    print(f"Valores no mapeados en '{column}': {unmapped}")
+    print(f"Valores no mapeados en '{column}': {list(unmapped)}")
   
   return df
 
@@ -254,7 +363,7 @@ def encode_all_ordinals(df: pd.DataFrame) -> pd.DataFrame:
     print(" employment -> employment_encoded")
   
   # Hijos (si existe como string)
-  if 'children' in df.columns and df['children'].dtype == 'object':
+  if 'children' in df.columns and not pd.api.types.is_numeric_dtype(df['children']):
     df = encode_ordinal_variable(df,'children',CHILDREN_ORDER)
     print(" children -> children_encoded")
   
@@ -276,17 +385,14 @@ def create_consumption_segment(df:pd.DataFrame, cups_col: str = 'cups_per_day_en
   pd.DataFrame
     DataFrame con nueva columna 'consumption_segment'
   """
-  def segment_consumer(cups):
-    if pd.isna(cups):
-      return 'Unkown'
-    elif cups == 0:
-      return 'Light (<1 cup)'
-    elif cups in [1,2]:
-      return 'Moderate (1-2 cups)'
-    else:
-      return 'Heavy (3+ cups)'
-  
-  df['consumption_segment'] = df[cups_col].apply(segment_consumer)
+  cups = df[cups_col].to_numpy(dtype='float64', na_value=np.nan)
+
+  # Código de tazas (0-5) -> posición en CONSUMPTION_SEGMENTS; el último es para NaN.
+  # Cualquier otro valor (negativo, fraccionario, >5) cae en Heavy, como el else original
+  segment_by_code = np.array([0, 1, 1, 2, 2, 2, 3])
+  positions = _lookup_positions(cups, segment_by_code, default=2)
+
+  df['consumption_segment'] = pd.Categorical.from_codes(positions, categories=CONSUMPTION_SEGMENTS)
   print("Segmentos de consumo creados: Light, Moderate, Heavy")
   return df
 
@@ -306,26 +412,38 @@ def create_age_groups(df: pd.DataFrame, age_col: str = 'age_encoded') -> pd.Data
   pd.DataFrame
     Dataset con nueva columna 'age_group' 
   """
-  def group_age(age_code):
-    if pd.isna(age_code):
-      return 'Unknown'
-    if age_code <= 1: # <18, 18-24
-      return 'Gen Z (<25)'
-    if age_code == 2: # 25-34
-      return 'Young Millennials (25-34)'
-    if age_code == 3: # 35-44
-      return 'Older Millennials (35-44)'
-    if age_code in [4,5]: # 45-54, 55-64
-      return 'Gen X (45-64)'
-    else: # 65+
-      return 'Boomers+ (65+)'
-    
-  df['age_group'] = df[age_col].apply(group_age)
+  ages = df[age_col].to_numpy(dtype='float64', na_value=np.nan)
+
+  # Código de edad (0-6) -> posición en AGE_GROUPS; el último es para NaN
+  # <=1 (<18, 18-24), 2 (25-34), 3 (35-44), 4-5 (45-64), 6 (65+)
+  # Cualquier otro valor cae en Boomers+, salvo los <= 1 que son Gen Z
+  group_by_code = np.array([0, 0, 1, 2, 3, 3, 4, 5])
+  positions = _lookup_positions(ages, group_by_code, default=4)
+  positions[ages <= 1] = 0
+
+  df['age_group'] = pd.Categorical.from_codes(positions, categories=AGE_GROUPS)
 
   print("Grupos de edad creados: Gen Z, Millenials, Gen z, Boomers+")
 
   return df
 
+def _lookup_positions(values: np.ndarray, table: np.ndarray, default: int) -> np.ndarray:
+  """
+  Traduce códigos ordinales a posiciones de categoría con una tabla de
+  búsqueda: un solo acceso por índice sobre el array, sin condiciones por fila.
+
+  table[i] es la posición del código entero i (0 <= i < len(table) - 1) y el
+  último elemento de table se usa para NaN. Los valores fuera de la tabla
+  (negativos, fraccionarios o mayores) reciben default.
+  """
+  n_codes = len(table) - 1
+  in_table = (values >= 0) & (values < n_codes) & (values == np.floor(values))
+  idx = np.where(in_table, values, n_codes).astype(np.intp)
+
+  positions = table[idx]
+  positions[~in_table & ~np.isnan(values)] = default
+  return positions
+
 # -------------------------------------------------------------
 # MANEJO DE VALORES FALTANTES
 # -------------------------------------------------------------
@@ -350,14 +468,16 @@ def impute_demographic_missing(df: pd.DataFrame, strategy: str = 'mode') -> pd.D
     
     for col in demographic_cols:
         if col in df.columns:
-            missing_count = df[col].isna().sum()
+            # Un solo value_counts da la moda y, por diferencia, los faltantes
+            counts = df[col].value_counts(dropna=True)
+            missing_count = len(df) - counts.sum()
             if missing_count > 0:
                 if strategy == 'mode':
-                    mode_value = df[col].mode()[0] if len(df[col].mode()) > 0 else 'Unknown'
-                    df[col].fillna(mode_value, inplace=True)
+                    mode_value = counts.index[0] if len(counts) > 0 else 'Unknown'
+                    df[col] = df[col].fillna(mode_value)
                     print(f"  {col}: {missing_count} valores imputados con moda ({mode_value})")
                 else:
-                    df[col].fillna('Unknown', inplace=True)
+                    df[col] = df[col].fillna('Unknown')
                     print(f"  {col}: {missing_count} valores imputados con 'Unknown'")
     
     return df
@@ -376,16 +496,19 @@ def fill_binary_columns_with_false(df: pd.DataFrame) -> pd.DataFrame:
     pd.DataFrame
         Dataset con columnas binarias completas
     """
-    # Identificar columnas binarias
+    # Identificar columnas binarias (solo pueden serlo las de tipo bool, object o texto
+    # con exactamente dos valores distintos; nunique es una sola reducción)
+    candidates = df.select_dtypes(include=['bool', 'object', 'string'])
+    n_unique = candidates.nunique(dropna=True)
     binary_cols = []
-    for col in df.columns:
+    for col in n_unique.index[n_unique == 2]:
         unique_vals = df[col].dropna().unique()
         if len(unique_vals) == 2 and set(unique_vals).issubset({True, False, 'True', 'False'}):
             binary_cols.append(col)
     
-    # Rellenar con False
-    for col in binary_cols:
-        df[col].fillna(False, inplace=True)
+    # Rellenar con False en una sola asignación de bloque
+    if binary_cols:
+        df[binary_cols] = df[binary_cols].fillna(False)
     
     print(f"  {len(binary_cols)} columnas binarias rellenadas con False")
     
@@ -395,191 +518,183 @@ def fill_binary_columns_with_false(df: pd.DataFrame) -> pd.DataFrame:
 # CREACIÓN DE SUBSETS TEMÁTICOS
 # -------------------------------------------------------------
 
-def create_consumption_subset(df: pd.DataFrame) -> pd.DataFrame:
+# Texto que identifica las columnas de cada pregunta de opción múltiple
+COLUMN_PATTERNS = {
+    'place': 'Where do you typically drink coffee?',
+    'brewing': 'How do you brew coffee at home?',
+    'purchase': 'where do you typically purchase coffee?',
+    'dairy': 'What kind of dairy do you add?',
+    'sweetener': 'What kind of sugar or sweetener do you add?'
+}
+
+# Columnas demográficas comunes a todos los subsets
+SUBSET_BASE_COLS = ['submission_id', 'age', 'age_encoded', 'age_group',
+                    'gender', 'education',
+                    'education_encoded',
+                    'employment', 'employment_encoded',
+                    'children', 'children_encoded',
+                    'political_affiliation']
+
+# Para cada subset: (columnas adicionales, bucket de COLUMN_PATTERNS, nombre en el log)
+SUBSET_SPECS = {
+    'consumption': (['cups_per_day', 'cups_per_day_encoded', 'consumption_segment'], None, 'consumo'),
+    'place': (['cups_per_day_encoded', 'consumption_segment'], 'place', 'lugares'),
+    'brewing': (['cups_per_day_encoded', 'consumption_segment'], 'brewing', 'métodos en casa'),
+    'onthego': (['cups_per_day_encoded', 'consumption_segment'], 'purchase', 'compras on-the-go'),
+    'dairy': (['cups_per_day_encoded', 'consumption_segment'], 'dairy', 'lácteos'),
+    'sweetener': (['cups_per_day_encoded', 'consumption_segment'], 'sweetener', 'azucarantes')
+}
+
+def get_column_buckets(df: pd.DataFrame) -> Dict[str, List[str]]:
     """
-    Crea subset para análisis de consumo diario.
+    Agrupa las columnas del dataset por pregunta (ver COLUMN_PATTERNS).
+    
+    Calcularlo una vez y pasarlo a los create_*_subset evita recorrer
+    df.columns en cada subset.
     
     Returns:
     --------
-    pd.DataFrame
-        Subset con columnas relevantes
+    Dict[str, List[str]]
+        Columnas de cada pregunta
     """
-    base_cols = ['submission_id', 'age', 'age_encoded','age_group', 
-                 'gender', 'education',
-                 'education_encoded', 'employment','employment_encoded', 
-                 'children','children_encoded', 
-                 'political_affiliation']
-    consumption_cols = ['cups_per_day', 'cups_per_day_encoded', 'consumption_segment']
-    
-    cols = [col for col in base_cols + consumption_cols if col in df.columns]
-    
-    subset = df[cols].copy()
+    return {
+        key: df.columns[df.columns.str.contains(pattern, case=False, regex=False)].tolist()
+        for key, pattern in COLUMN_PATTERNS.items()
+    }
 
-    # Rellenar NaN en children con '0' (sin hijos)
-    if 'children' in subset.columns:
-        subset['children'].fillna('0', inplace=True)
-    if 'children_encoded' in subset.columns:
-        subset['children_encoded'].fillna(0, inplace=True)
 
-    print(f" Subset de consumo creado: {subset.shape}")
+def get_subset_source_columns(filepath: str) -> List[str]:
+    """
+    Columnas del archivo original que usa algún subset: las demográficas de
+    COLUMN_RENAMES y las preguntas de COLUMN_PATTERNS.
     
-    return subset
+    Solo lee la cabecera (o el esquema, si es Parquet).
+    
+    Returns:
+    --------
+    List[str]
+        Nombres de columna limpios (sin BOM ni espacios)
+    """
+    if filepath.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        header = pd.Index(pq.read_schema(filepath).names)
+    else:
+        header = pd.read_csv(filepath, nrows=0).columns
+    header = header.str.replace('\ufeff', '').str.strip()
+    
+    keep = header.isin(list(COLUMN_RENAMES.keys()))
+    for pattern in COLUMN_PATTERNS.values():
+        keep |= header.str.contains(pattern, case=False, regex=False)
+    
+    return header[keep].tolist()
 
 
-def create_place_subset(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Crea subset para análisis de lugares de consumo.
+def create_subset(
+    df: pd.DataFrame,
+    key: str,
+    col_buckets: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
     """
-    base_cols = ['submission_id', 'age', 'age_encoded', 'age_group', 
-                 'gender', 'education', 
-                 'education_encoded',                                 
-                 'employment', 'employment_encoded',                   
-                 'children', 'children_encoded',                       
-                 'political_affiliation', 
-                 'cups_per_day_encoded', 'consumption_segment']
+    Crea un subset temático con las columnas demográficas base.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Dataset limpio
+    key : str
+        Subset a crear (ver SUBSET_SPECS)
+    col_buckets : Dict[str, List[str]], optional
+        Resultado de get_column_buckets (se calcula si no se pasa)
     
-    # Buscar columnas de lugares
-    place_cols = [col for col in df.columns if 'Where do you typically drink coffee?' in col]
+    Returns:
+    --------
+    pd.DataFrame
+        Subset con columnas relevantes
+    """
+    extra_cols, bucket, label = SUBSET_SPECS[key]
     
-    cols = [col for col in base_cols + place_cols if col in df.columns]
+    # Buscar columnas de la pregunta
+    question_cols = []
+    if bucket is not None:
+        if col_buckets is None:
+            col_buckets = get_column_buckets(df)
+        question_cols = col_buckets[bucket]
     
-    subset = df[cols].copy()
+    cols = [col for col in SUBSET_BASE_COLS + extra_cols + question_cols if col in df.columns]
     
-    # Rellenar NaN en children                 
-    if 'children' in subset.columns:
-        subset['children'].fillna('0', inplace=True)
-    if 'children_encoded' in subset.columns:
-        subset['children_encoded'].fillna(0, inplace=True)
+    subset = df[cols]
     
-    print(f" Subset de lugares creado: {subset.shape}")
+    print(f" Subset de {label} creado: {subset.shape}")
     
     return subset
 
 
-def create_home_brewing_subset(df: pd.DataFrame) -> pd.DataFrame:
+def create_consumption_subset(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Crea subset para análisis de consumo diario.
+    """
+    return create_subset(df, 'consumption')
+
+
+def create_place_subset(
+    df: pd.DataFrame,
+    col_buckets: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
+    """
+    Crea subset para análisis de lugares de consumo.
+    """
+    return create_subset(df, 'place', col_buckets)
+
+
+def create_home_brewing_subset(
+    df: pd.DataFrame,
+    col_buckets: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
     """
     Crea subset para análisis de métodos de preparación en casa.
     """
-    base_cols = ['submission_id', 'age', 'age_encoded', 'age_group', 
-                 'gender', 'education', 
-                 'education_encoded',                   
-                 'employment', 'employment_encoded',             
-                 'children', 'children_encoded',                   
-                 'political_affiliation', 
-                 'cups_per_day_encoded', 'consumption_segment']    
-    
-    # Buscar columnas de métodos de preparación
-    brewing_cols = [col for col in df.columns if 'How do you brew coffee at home?' in col]
-    
-    cols = [col for col in base_cols + brewing_cols if col in df.columns]
-    
-    subset = df[cols].copy()
-    
-    # Rellenar NaN en children                              
-    if 'children' in subset.columns:
-        subset['children'].fillna('0', inplace=True)
-    if 'children_encoded' in subset.columns:
-        subset['children_encoded'].fillna(0, inplace=True)
-    
-    print(f" Subset de métodos en casa creado: {subset.shape}")
-    
-    return subset
+    return create_subset(df, 'brewing', col_buckets)
 
 
-def create_onthego_subset(df: pd.DataFrame) -> pd.DataFrame:
+def create_onthego_subset(
+    df: pd.DataFrame,
+    col_buckets: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
     """
     Crea subset para análisis de negocios de compra on-the-go.
     """
-    base_cols = ['submission_id', 'age', 'age_encoded', 'age_group',  
-                 'gender', 'education', 
-                 'education_encoded',                         
-                 'employment', 'employment_encoded',             
-                 'children', 'children_encoded',           
-                 'political_affiliation', 
-                 'cups_per_day_encoded', 'consumption_segment'] 
-    
-    # Buscar columnas de compra on-the-go
-    purchase_cols = [col for col in df.columns if 'where do you typically purchase coffee?' in col.lower()]
-    
-    cols = [col for col in base_cols + purchase_cols if col in df.columns]
-    
-    subset = df[cols].copy()
-    
-    # Rellenar NaN en children             
-    if 'children' in subset.columns:
-        subset['children'].fillna('0', inplace=True)
-    if 'children_encoded' in subset.columns:
-        subset['children_encoded'].fillna(0, inplace=True)
-    
-    print(f" Subset de compras on-the-go creado: {subset.shape}")
-    
-    return subset
+    return create_subset(df, 'onthego', col_buckets)
 
 
-def create_dairy_subset(df: pd.DataFrame) -> pd.DataFrame:
+def create_dairy_subset(
+    df: pd.DataFrame,
+    col_buckets: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
     """
     Crea subset para análisis de preferencias de lácteos.
     """
-    base_cols = ['submission_id', 'age', 'age_encoded', 'age_group',  
-                 'gender', 'education', 
-                 'education_encoded',                            
-                 'employment', 'employment_encoded',              
-                 'children', 'children_encoded',                  
-                 'political_affiliation', 
-                 'cups_per_day_encoded', 'consumption_segment']  
-    
-    # Buscar columnas de lácteos
-    dairy_cols = [col for col in df.columns if 'What kind of dairy do you add?' in col]
-    
-    cols = [col for col in base_cols + dairy_cols if col in df.columns]
-    
-    subset = df[cols].copy()
-    
-    # Rellenar NaN en children                               
-    if 'children' in subset.columns:
-        subset['children'].fillna('0', inplace=True)
-    if 'children_encoded' in subset.columns:
-        subset['children_encoded'].fillna(0, inplace=True)
-    
-    print(f" Subset de lácteos creado: {subset.shape}")
-    
-    return subset
+    return create_subset(df, 'dairy', col_buckets)
 
 
-def create_sweetener_subset(df: pd.DataFrame) -> pd.DataFrame:
+def create_sweetener_subset(
+    df: pd.DataFrame,
+    col_buckets: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
     """
     Crea subset para análisis de azucarantes.
     """
-    base_cols = ['submission_id', 'age', 'age_encoded', 'age_group',  
-                 'gender', 'education', 
-                 'education_encoded',                         
-                 'employment', 'employment_encoded',             
-                 'children', 'children_encoded',                
-                 'political_affiliation', 
-                 'cups_per_day_encoded', 'consumption_segment']    
-    
-    # Buscar columnas de azucarantes
-    sweetener_cols = [col for col in df.columns if 'What kind of sugar or sweetener do you add?' in col]
-    
-    cols = [col for col in base_cols + sweetener_cols if col in df.columns]
-    
-    subset = df[cols].copy()
-    
-    # Rellenar NaN en children                                  
-    if 'children' in subset.columns:
-        subset['children'].fillna('0', inplace=True)
-    if 'children_encoded' in subset.columns:
-        subset['children_encoded'].fillna(0, inplace=True)
-    
-    print(f" Subset de azucarantes creado: {subset.shape}")
-    
-    return subset
+    return create_subset(df, 'sweetener', col_buckets)
 
 # ------------------------------------------------------------------------------
 # PIPELINE COMPLETO DE LIMPIEZA
 # -----------------------------------------------------------------------------
 
-def full_cleaning_pipeline(filepath: str, output_path: Optional[str] = None) -> pd.DataFrame:
+def full_cleaning_pipeline(
+    filepath: str,
+    output_path: Optional[str] = None,
+    output_format: str = 'parquet',
+    subset_columns_only: bool = False
+) -> pd.DataFrame:
     """
     Pipeline completo de limpieza y transformación.
     
@@ -588,20 +703,36 @@ def full_cleaning_pipeline(filepath: str, output_path: Optional[str] = None) ->
     filepath : str
         Ruta al CSV original
     output_path : str, optional
-        Ruta para guardar el CSV limpio
+        Ruta para guardar el dataset limpio
+    output_format : str
+        Formato de salida ('parquet' o 'csv'). Con 'parquet' la extensión
+        de output_path se cambia a .parquet (default: 'parquet')
+    subset_columns_only : bool
+        Cargar solo las columnas que usan los create_*_subset (default: False)
         
     Returns:
     --------
     pd.DataFrame
         Dataset completamente limpio y transformado
+    
+    Raises:
+    -------
+    ValueError
+        Si output_format no es 'parquet' ni 'csv'
     """
+    output_format = output_format.lower()
+    if output_format not in ('parquet', 'csv'):
+        raise ValueError(f"output_format debe ser 'parquet' o 'csv', no '{output_format}'")
+    
     print("="*80)
     print("INICIANDO PIPELINE DE LIMPIEZA")
     print("="*80)
     
     # 1. Cargar y limpieza inicial
     print("\n[1/7] Cargando datos...")
-    df = load_and_initial_clean(filepath)
+    # Con la copia Parquet, las columnas casi vacías ni siquiera se leen
+    columns = get_subset_source_columns(filepath) if subset_columns_only else None
+    df = load_and_initial_clean(filepath, columns=columns, max_missing=0.95)
     
     # 2. Eliminar columnas con alta tasa de missing
     print("\n[2/7] Eliminando columnas con >95% missing...")
@@ -625,12 +756,34 @@ def full_cleaning_pipeline(filepath: str, output_path: Optional[str] = None) ->
     # 6. Imputar valores faltantes
     print("\n[6/7] Imputando valores faltantes...")
     df = impute_demographic_missing(df, strategy='unknown')
+
+    # Sin respuesta en hijos se interpreta como sin hijos ('0')
+    if 'children' in df.columns:
+        df['children'] = df['children'].fillna('0')
+    if 'children_encoded' in df.columns:
+        df['children_encoded'] = df['children_encoded'].fillna(0)
     df = fill_binary_columns_with_false(df)
+
+    # Columnas de texto con pocas categorías: category ocupa mucha menos memoria
+    categorical_cols = ['gender', 'education', 'employment', 'ethnicity',
+                        'political_affiliation', 'consumption_segment', 'age_group']
+    for col in categorical_cols:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
     
     # 7. Guardar si se especifica path
     if output_path:
-        print(f"\n[7/7] Guardando dataset limpio en {output_path}...")
-        df.to_csv(output_path, index=False)
+        if output_format == 'csv':
+            print(f"\n[7/7] Guardando dataset limpio en {output_path}...")
+            df.to_csv(output_path, index=False)
+        else:
+            # Parquet guarda las categorías como diccionario y comprime por columna
+            parquet_path = os.path.splitext(output_path)[0] + '.parquet'
+            if parquet_path != output_path:
+                print(f"\nAviso: output_format='parquet', se guarda en {parquet_path} en lugar de {output_path}")
+                output_path = parquet_path
+            print(f"\n[7/7] Guardando dataset limpio en {output_path}...")
+            df.to_parquet(output_path, engine='pyarrow', compression='zstd', index=False)
         print("✓ Guardado exitosamente")
     else:
         print("\n[7/7] No se especificó ruta de salida, omitiendo guardado")
@@ -654,8 +807,8 @@ def quick_summary(df: pd.DataFrame) -> None:
     print(f"Memoria: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
     
     # Valores faltantes
-    missing = df.isnull().sum().sum()
-    total_cells = df.shape[0] * df.shape[1]
+    total_cells = df.size
+    missing = total_cells - int(df.count().sum())
     print(f"\nValores faltantes: {missing:,} ({missing/total_cells*100:.2f}%)")
     
     # Tipos de datos
@@ -693,11 +846,13 @@ if __name__ == "__main__":
     print("CREANDO SUBSETS TEMÁTICOS")
     print("="*80 + "\n")
     
+    col_buckets = get_column_buckets(df_clean)
+    
     subset_consumption = create_consumption_subset(df_clean)
-    subset_places = create_place_subset(df_clean)
-    subset_brewing = create_home_brewing_subset(df_clean)
-    subset_onthego = create_onthego_subset(df_clean)
-    subset_dairy = create_dairy_subset(df_clean)
-    subset_sweetener = create_sweetener_subset(df_clean)
+    subset_places = create_place_subset(df_clean, col_buckets)
+    subset_brewing = create_home_brewing_subset(df_clean, col_buckets)
+    subset_onthego = create_onthego_subset(df_clean, col_buckets)
+    subset_dairy = create_dairy_subset(df_clean, col_buckets)
+    subset_sweetener = create_sweetener_subset(df_clean, col_buckets)
     
     print("\n Todos los subsets creados exitosamente")
\ No newline at end of file